@@ -1,13 +1,18 @@
 # Tube Guessr — stable overlay (SVG rings + SVG labels) — gapless (no iframe)
-import base64
+import binascii
+import bisect
 import csv
 import datetime as dt
 import random
 import re
 import html
-from dataclasses import dataclass
+import string
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
 
 import streamlit as st
 
@@ -19,6 +24,7 @@ DB_PATH  = BASE_DIR / "stations_db.csv"
 
 # -------------------- TUNING --------------------
 VIEW_W, VIEW_H = 980, 620   # SVG viewBox target in the page
+VIEW_CX, VIEW_CY = VIEW_W / 2, VIEW_H / 2
 ZOOM        = 3.0
 RING_PX     = 28
 RING_STROKE = 6
@@ -31,19 +37,38 @@ class Station:
     fx: float
     fy: float
     lines: List[str]
-    @property
-    def key(self) -> str:
-        return norm(self.name)
+    lines_mask: int = 0     # one bit per line, assigned in load_db
+    key: str = field(init=False, repr=False)
+    lines_set: FrozenSet[str] = field(init=False, repr=False)
+    def __post_init__(self):
+        # Interned so key comparisons and by_key lookups hit the identity fast path.
+        self.name = sys.intern(self.name)
+        self.key = sys.intern(norm(self.name))
+        self.lines_set = frozenset(self.lines)
+
+# Everything ASCII except a-z0-9; input is lowercased first so A-Z never reaches it.
+_NORM_DROP = str.maketrans("", "", "".join(
+    c for c in map(chr, range(128)) if c not in string.ascii_lowercase + string.digits))
+_APOS_DROP = str.maketrans("", "", "’'")
+_NORM_RE = re.compile(r"[^a-z0-9]+")
+
+def _norm(s: str) -> str:
+    s = (s or "").lower()
+    if s.isascii():
+        return s.translate(_NORM_DROP)
+    return _NORM_RE.sub("", s)
+
+def _clean_display(s: str) -> str:
+    s = (s or "").translate(_APOS_DROP).replace("&", "and")
+    return " ".join(s.split())
 
-def norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", (s or "").lower())
+@st.cache_resource(show_spinner=False)
+def _text_memos() -> Tuple[Callable[[str], str], Callable[[str], str]]:
+    # Streamlit re-execs this script on every rerun, so a module-level lru_cache
+    # would start empty each time; keep the memoized wrappers in a process cache.
+    return lru_cache(maxsize=4096)(_norm), lru_cache(maxsize=4096)(_clean_display)
 
-def clean_display(s: str) -> str:
-    s = (s or "").strip()
-    s = re.sub(r"[’']", "", s)
-    s = s.replace("&", "and")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+norm, clean_display = _text_memos()
 
 ALIASES = {
     "towerhamlets": "Tower Hill",
@@ -54,6 +79,8 @@ ALIASES = {
     "tottenham crt rd": "Tottenham Court Road",
     "tottenham court rd": "Tottenham Court Road",
 }
+# Lookups go through norm(), so the keys must be normalised too ("kings cross" -> "kingscross").
+_ALIAS_BY_KEY = {norm(k): v for k, v in ALIASES.items()}
 
 def normalize_lines(lines: List[str]) -> List[str]:
     return sorted(set([(l or "").lower().strip() for l in lines if l]))
@@ -64,148 +91,205 @@ def ensure_db():
         with open(DB_PATH, "w", newline="", encoding="utf-8") as f:
             csv.writer(f).writerow(["name", "fx", "fy", "lines"])
 
-def load_db() -> Tuple[List[Station], Dict[str, Station], List[str]]:
+@st.cache_resource(show_spinner=False)
+def load_db() -> Tuple[Tuple[Station, ...], Mapping[str, Station], Tuple[str, ...],
+                       Tuple[List[str], List[str]]]:
+    # Cached once per process and shared by every session, so hand out read-only views.
     ensure_db()
     stations: List[Station] = []
+    line_bits: Dict[str, int] = {}
     with open(DB_PATH, newline="", encoding="utf-8") as f:
-        rdr = csv.DictReader(f)
-        for r in rdr:
-            try:
-                name = clean_display(r["name"])
-                fx = float(r["fx"]); fy = float(r["fy"])
-                lines = normalize_lines(r.get("lines", "").split(";"))
-                if 0 <= fx <= 1 and 0 <= fy <= 1 and name:
-                    stations.append(Station(name, fx, fy, lines))
-            except Exception:
-                continue
+        rdr = csv.reader(f)
+        col = {h: i for i, h in enumerate(next(rdr, []))}
+        if all(k in col for k in ("name", "fx", "fy")):
+            i_name, i_fx, i_fy, i_lines = col["name"], col["fx"], col["fy"], col.get("lines")
+            for row in rdr:
+                try:
+                    name = clean_display(row[i_name])
+                    fx = float(row[i_fx]); fy = float(row[i_fy])
+                    lines = normalize_lines((row[i_lines] if i_lines is not None else "").split(";"))
+                    if 0 <= fx <= 1 and 0 <= fy <= 1 and name:
+                        mask = 0
+                        for l in lines:
+                            mask |= line_bits.setdefault(l, 1 << len(line_bits))
+                        stations.append(Station(name, fx, fy, lines, mask))
+                except Exception:
+                    continue
     by_key = {s.key: s for s in stations}
-    return stations, by_key, sorted([s.name for s in stations])
+    names = tuple(sorted(s.name for s in stations))
+    return tuple(stations), MappingProxyType(by_key), names, build_prefix_index(names)
 
 # -------------------- LOOKUP / SUGGEST --------------------
 def alias_name(q: str) -> str:
-    return ALIASES.get(norm(q), q)
+    return _ALIAS_BY_KEY.get(norm(q), q)
 
-def resolve_guess(q: str, by_key: Dict[str, Station]) -> Optional[Station]:
-    q = alias_name(q)
-    nq = norm(q)
+def resolve_guess(q: str, by_key: Mapping[str, Station]) -> Optional[Station]:
+    # Station names are clean_display()'d on load, so by_key is already keyed
+    # by norm(clean_display(name)) and a single lookup covers the old scan.
+    nq = norm(alias_name(q))
     if not nq: return None
-    if nq in by_key: return by_key[nq]
-    for s in by_key.values():
-        if norm(s.name) == nq or norm(clean_display(s.name)) == nq:
-            return s
-    return None
+    return by_key.get(nq)
 
 def same_line(a: Station, b: Station) -> bool:
-    return bool(set(a.lines) & set(b.lines))
+    return (a.lines_mask & b.lines_mask) != 0
 
 def overlap_lines(a: Station, b: Station) -> List[str]:
-    return sorted(list(set(a.lines) & set(b.lines)))
+    if not same_line(a, b):
+        return []
+    return sorted(a.lines_set & b.lines_set)
 
-def prefix_suggestions(q: str, names: List[str], limit: int = 5) -> List[str]:
+def build_prefix_index(names: Sequence[str]) -> Tuple[List[str], List[str]]:
+    pairs = sorted((n.lower(), n) for n in names)
+    return [lo for lo, _ in pairs], [n for _, n in pairs]
+
+def prefix_suggestions(q: str, index: Tuple[List[str], List[str]], limit: int = 5) -> List[str]:
     q = (q or "").strip().lower()
     if not q:
         return []
-    matches = [n for n in names if n.lower().startswith(q)]
-    return sorted(matches)[:limit]
+    lowered, display = index
+    lo = bisect.bisect_left(lowered, q)
+    hi = bisect.bisect_left(lowered, q + "\uffff", lo)
+    return sorted(display[lo:hi])[:limit]
 
 # -------------------- ASSETS --------------------
+_VIEWBOX_RE = re.compile(r'viewBox\s*=\s*"([\d.\s,\-]+)"')
+_WIDTH_RE   = re.compile(r'width\s*=\s*"([^"]+)"')
+_HEIGHT_RE  = re.compile(r'height\s*=\s*"([^"]+)"')
+_NUM_RE     = re.compile(r"[^0-9.]")
+_HEX_RE     = re.compile(r"#([0-9a-fA-F]{6})\b")
+_TAG_GAP_RE = re.compile(r">\s+<")
+_SVG_NS_RE  = re.compile(r'xmlns:(\w+)="http://www\.w3\.org/2000/svg"')
+_PATH_D_RE  = re.compile(r' d="([^"]*)"')
+_LONG_DEC_RE = re.compile(r"\d+\.\d{3,}")
+
+def minify_svg(txt: str) -> str:
+    # The map has no <text> nodes, so whitespace between tags carries nothing.
+    txt = _TAG_GAP_RE.sub("><", txt)
+    # ElementTree re-exports write every tag as <ns0:path ...>; use the default namespace instead.
+    m = _SVG_NS_RE.search(txt)
+    if m and f" {m.group(1)}:" not in txt:
+        p = m.group(1)
+        txt = txt.replace(f"xmlns:{p}=", "xmlns=", 1).replace(f"<{p}:", "<").replace(f"</{p}:", "</")
+    # Path data in map units: 0.01 is well under a screen pixel even at ZOOM.
+    def round_path(m: "re.Match[str]") -> str:
+        return ' d="' + _LONG_DEC_RE.sub(lambda n: f"{float(n.group()):.2f}", m.group(1)) + '"'
+    return _PATH_D_RE.sub(round_path, txt)
+
+def _srgb_to_linear(c: float) -> float:
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+def _linear_to_srgb(c: float) -> float:
+    return 12.92 * c if c <= 0.0031308 else 1.055 * c ** (1 / 2.4) - 0.055
+
+def grayscale_svg(txt: str) -> str:
+    # Same luminance matrix the old #gray feColorMatrix applied (in linearRGB),
+    # baked into the hex colours once so the browser doesn't filter every frame.
+    memo: Dict[str, str] = {}
+    def repl(m: "re.Match[str]") -> str:
+        h = m.group(1).lower()
+        if h not in memo:
+            r, g, b = (_srgb_to_linear(int(h[i:i+2], 16) / 255) for i in (0, 2, 4))
+            y = _linear_to_srgb(0.2126 * r + 0.7152 * g + 0.0722 * b)
+            v = min(255, max(0, round(y * 255)))
+            memo[h] = f"#{v:02x}{v:02x}{v:02x}"
+        return memo[h]
+    return _HEX_RE.sub(repl, txt)
+
+def parse_svg_size(txt: str) -> Tuple[float, float]:
+    m = _VIEWBOX_RE.search(txt)
+    if m:
+        _, _, w_str, h_str = m.group(1).replace(",", " ").split()
+        return float(w_str), float(h_str)
+    def f(v): return float(_NUM_RE.sub("", v)) if v else 3200.0
+    w_attr = _WIDTH_RE.search(txt)
+    h_attr = _HEIGHT_RE.search(txt)
+    return f(w_attr.group(1) if w_attr else None), f(h_attr.group(1) if h_attr else None)
+
+def svg_data_uri(txt: str) -> str:
+    b64 = binascii.b2a_base64(txt.encode("utf-8"), newline=False).decode("ascii")
+    return f"data:image/svg+xml;base64,{b64}"
+
 @st.cache_resource(show_spinner=False)
-def load_svg_data(svg_path: Path) -> Tuple[str, float, float]:
+def load_svg_data(svg_path: Path) -> Tuple[str, str, float, float]:
     if not svg_path.exists():
         raise FileNotFoundError(f"SVG not found: {svg_path}")
     raw = svg_path.read_bytes()
     txt = raw.decode("utf-8", errors="ignore")
-    m = re.search(r'viewBox="([\d.\s\-]+)"', txt)
-    if m:
-        _, _, w_str, h_str = m.group(1).split()
-        base_w = float(w_str); base_h = float(h_str)
-    else:
-        def f(v): return float(re.sub(r"[^0-9.]", "", v)) if v else 3200.0
-        w_attr = re.search(r'width="([^"]+)"', txt)
-        h_attr = re.search(r'height="([^"]+)"', txt)
-        base_w = f(w_attr.group(1) if w_attr else None)
-        base_h = f(h_attr.group(1) if h_attr else None)
-    b64 = base64.b64encode(raw).decode("ascii")
-    return f"data:image/svg+xml;base64,{b64}", base_w, base_h
+    base_w, base_h = parse_svg_size(txt)
+    txt = minify_svg(txt)
+    return svg_data_uri(txt), svg_data_uri(grayscale_svg(txt)), base_w, base_h
 
 # -------------------- GEOMETRY --------------------
 def css_transform(baseW: float, baseH: float, fx_center: float, fy_center: float, zoom: float) -> Tuple[float, float]:
     cx, cy = fx_center * baseW, fy_center * baseH
-    tx = VIEW_W / 2 - cx * zoom
-    ty = VIEW_H / 2 - cy * zoom
+    tx = VIEW_CX - cx * zoom
+    ty = VIEW_CY - cy * zoom
     return tx, ty
 
-def project_to_screen(baseW: float, baseH: float,
-                      fx_target: float, fy_target: float,
-                      fx_center: float, fy_center: float,
-                      zoom: float) -> Tuple[float, float]:
+def project_many(baseW: float, baseH: float,
+                 points: List[Tuple[float, float]],
+                 fx_center: float, fy_center: float,
+                 zoom: float) -> List[Tuple[float, float]]:
     tx, ty = css_transform(baseW, baseH, fx_center, fy_center, zoom)
-    x = fx_target * baseW * zoom + tx
-    y = fy_target * baseH * zoom + ty
-    return x, y
+    kx, ky = baseW * zoom, baseH * zoom
+    return [(fx * kx + tx, fy * ky + ty) for fx, fy in points]
 
 # -------------------- RENDER (SVG with rings + chips) --------------------
+CHIP_CHAR_W, CHIP_PAD_X, CHIP_H = 7.2, 8.0, 20.0
+
+_RING_STAMP_SVG = (
+    '<g id="{id}">'
+    '<circle r="{r:.1f}" fill="currentColor" fill-opacity="0.18" stroke="currentColor" stroke-width="3"/>'
+    '<circle r="{r_in:.1f}" fill="none" stroke="currentColor" stroke-width="3"/>'
+    '</g>'
+)
+_RING_USE_SVG = (
+    '<use class="guess-marker" href="#{id}" x="{x:.1f}" y="{y:.1f}" color="{color}" pointer-events="none"/>'
+)
+_CHIP_SVG = (
+    '<g class="chip" pointer-events="none">'
+    '<rect x="{x:.1f}" y="{y:.1f}" rx="8" ry="8" width="{w:.1f}" height="{h:.1f}" fill="#111827" fill-opacity="0.95"/>'
+    '<text x="{tx:.1f}" y="{ty:.1f}" font-size="12" font-weight="600" fill="#ffffff">{label}</text>'
+    '</g>'
+)
+
 def make_map_html(svg_uri: str, baseW: float, baseH: float,
                   fx_center: float, fy_center: float,
-                  zoom: float, colorize: bool, ring_color: str,
+                  zoom: float, ring_color: str,
                   rings_and_labels: Optional[List[Tuple[float,float,str,float,str]]] = None) -> str:
     tx, ty = css_transform(baseW, baseH, fx_center, fy_center, zoom)
     r_px = max(RING_PX, 0.010 * min(baseW, baseH) * zoom)
 
-    gray_filter = """
-      <filter id="gray">
-        <feColorMatrix type="matrix"
-          values="0.2126 0.7152 0.0722 0 0
-                  0.2126 0.7152 0.0722 0 0
-                  0.2126 0.7152 0.0722 0 0
-                  0      0      0      1 0"/>
-      </filter>
-    """
-    image_style = 'filter:url(#gray);' if not colorize else ''
-
     ring_and_label_svg = ""
     if rings_and_labels:
-        parts = []
+        # One ring stamp per radius in <defs>; each guess is a <use> tinted via currentColor.
+        radii = sorted({rr for _, _, _, rr, _ in rings_and_labels})
+        stamp_id = {rr: f"guess-ring-{i}" for i, rr in enumerate(radii)}
+        parts = ["<defs>"]
+        parts += [_RING_STAMP_SVG.format(id=stamp_id[rr], r=rr, r_in=rr - 4) for rr in radii]
+        parts.append("</defs>")
         for sx, sy, color_hex, rr, label in rings_and_labels:
             safe_label = html.escape(label or "")
-            parts.append(
-                f"""<g class="guess-marker" pointer-events="none">
-                      <circle cx="{sx:.1f}" cy="{sy:.1f}" r="{rr:.1f}"
-                              fill="{color_hex}" fill-opacity="0.18"
-                              stroke="{color_hex}" stroke-width="3" />
-                      <circle cx="{sx:.1f}" cy="{sy:.1f}" r="{(rr-4):.1f}"
-                              fill="none" stroke="{color_hex}" stroke-width="3" />
-                    </g>"""
-            )
+            parts.append(_RING_USE_SVG.format(id=stamp_id[rr], x=sx, y=sy, color=color_hex))
             if safe_label:
-                char_w = 7.2; pad_x = 8.0; chip_h = 20.0
-                chip_w = pad_x*2 + char_w * len(safe_label)
+                chip_w = CHIP_PAD_X*2 + CHIP_CHAR_W * len(safe_label)
                 lx = sx + rr + 10.0
-                ly = sy - chip_h/2
+                ly = sy - CHIP_H/2
                 if lx + chip_w > VIEW_W - 6:
                     lx = max(6.0, sx - rr - 10.0 - chip_w)
                 lx = min(max(lx, 6.0), VIEW_W - chip_w - 6.0)
-                ly = min(max(ly, 6.0), VIEW_H - chip_h - 6.0)
-                parts.append(
-                    f"""<g class="chip" pointer-events="none">
-                          <rect x="{lx:.1f}" y="{ly:.1f}" rx="8" ry="8"
-                                width="{chip_w:.1f}" height="{chip_h:.1f}"
-                                fill="#111827" fill-opacity="0.95" />
-                          <text x="{(lx+pad_x):.1f}" y="{(ly+chip_h-6):.1f}"
-                                font-size="12" font-weight="600"
-                                fill="#ffffff">{safe_label}</text>
-                        </g>"""
-                )
+                ly = min(max(ly, 6.0), VIEW_H - CHIP_H - 6.0)
+                parts.append(_CHIP_SVG.format(x=lx, y=ly, w=chip_w, h=CHIP_H,
+                                              tx=lx + CHIP_PAD_X, ty=ly + CHIP_H - 6, label=safe_label))
         ring_and_label_svg = "\n".join(parts)
 
     return f"""
     <div class="map-wrap" style="width:min(100%, {VIEW_W}px); margin:0 auto 6px auto; position:relative;">
       <svg viewBox="0 0 {VIEW_W} {VIEW_H}" width="100%" style="display:block;border-radius:14px;background:#f6f7f8;">
-        <defs>{gray_filter}</defs>
         <g transform="translate({tx:.1f},{ty:.1f}) scale({zoom})">
-          <image href="{svg_uri}" width="{baseW}" height="{baseH}" style="{image_style}"/>
+          <image href="{svg_uri}" width="{baseW}" height="{baseH}"/>
         </g>
-        <circle cx="{VIEW_W/2:.1f}" cy="{VIEW_H/2:.1f}" r="{r_px:.1f}" stroke="{ring_color}"
+        <circle cx="{VIEW_CX:.1f}" cy="{VIEW_CY:.1f}" r="{r_px:.1f}" stroke="{ring_color}"
                 stroke-width="{RING_STROKE}" fill="none"
                 style="filter: drop-shadow(0 0 0 rgba(0,0,0,0.45));"/>
         {ring_and_label_svg}
@@ -222,6 +306,7 @@ def start_round(stations, by_key, names):
     st.session_state.history=[]
     st.session_state.remaining=MAX_GUESSES
     st.session_state.won=False
+    st.session_state.colorize=False
     st.session_state["feedback"] = ""
     rng = random.Random(20250501 + dt.date.today().toordinal()) if st.session_state.mode=="daily" else random.Random()
     choice_name = rng.choice(names)
@@ -266,6 +351,7 @@ if "phase" not in st.session_state:
     st.session_state.remaining=MAX_GUESSES
     st.session_state.history=[]
     st.session_state.won=False
+    st.session_state.colorize=False
 if "feedback" not in st.session_state:
     st.session_state["feedback"] = ""
 # Practice streak (practice only)
@@ -273,8 +359,8 @@ if "streak" not in st.session_state:
     st.session_state.streak = 0
 
 # Load assets & data
-SVG_URI, SVG_W, SVG_H = load_svg_data(SVG_PATH)
-STATIONS, BY_KEY, NAMES = load_db()
+SVG_URI, SVG_GRAY_URI, SVG_W, SVG_H = load_svg_data(SVG_PATH)
+STATIONS, BY_KEY, NAMES, NAME_INDEX = load_db()
 
 # Helpers
 def render_mode_picker(title_on_top=False):
@@ -289,6 +375,40 @@ def render_mode_picker(title_on_top=False):
     )
     st.session_state.mode = choice
 
+def submit_guess(name: str):
+    # Button callback: runs before the next script run, so the click costs one
+    # rerun instead of a run that records the guess plus an st.rerun().
+    answer: Station = st.session_state.answer or STATIONS[0]
+    st.session_state.history.append(name)
+    st.session_state.remaining -= 1
+    chosen = resolve_guess(name, BY_KEY)
+    # The map tint follows the latest guess; decide it here rather than on every rerun.
+    st.session_state.colorize = bool(chosen) and same_line(chosen, answer)
+    if chosen and chosen.key == answer.key:
+        st.session_state.won = True
+        st.session_state.phase = "end"
+        st.session_state["feedback"] = ""
+
+        # PRACTICE STREAK RULE:
+        # Increment only if it's a FIRST-TRY win; otherwise reset.
+        if st.session_state.mode == "practice":
+            if len(st.session_state.history) == 1:
+                st.session_state.streak += 1
+            else:
+                st.session_state.streak = 0
+    else:
+        if chosen and same_line(chosen, answer):
+            lines = ", ".join(overlap_lines(chosen, answer)) or "right line"
+            st.session_state["feedback"] = f"Wrong station, but correct line ({lines})."
+        else:
+            st.session_state["feedback"] = "Wrong station."
+        if st.session_state.remaining <= 0:
+            st.session_state.won = False
+            st.session_state.phase = "end"
+            # Reset streak on loss
+            if st.session_state.mode == "practice":
+                st.session_state.streak = 0
+
 def centered_play(label):
     st.markdown('<div class="play-center">', unsafe_allow_html=True)
     clicked = st.button(label, type="primary")
@@ -328,22 +448,25 @@ elif st.session_state.phase in ("play","end"):
     render_mode_picker(title_on_top=True)
 
     answer: Station = st.session_state.answer or STATIONS[0]
-    colorize=False
-    if st.session_state.history:
-        last = resolve_guess(st.session_state.history[-1], BY_KEY)
-        if last and same_line(last, answer): colorize=True
+    colorize = st.session_state.get("colorize", False)
     ring = "#22c55e" if (st.session_state.phase=="end" and st.session_state.won) else ("#eab308" if colorize else "#22c55e")
 
-    # Build rings + labels (in SVG)
-    rings_and_labels: List[Tuple[float,float,str,float,str]] = []
-    for gname in st.session_state.history:
-        st_obj = resolve_guess(gname, BY_KEY)
-        if not st_obj or st_obj.key == answer.key:
-            continue
-        sx, sy = project_to_screen(SVG_W, SVG_H, st_obj.fx, st_obj.fy, answer.fx, answer.fy, ZOOM)
-        if 0 <= sx <= VIEW_W and 0 <= sy <= VIEW_H:
-            color_hex = "#f59e0b" if same_line(st_obj, answer) else "#ef4444"
-            rings_and_labels.append((sx, sy, color_hex, 34.0, st_obj.name))
+    # Rebuild the map only when something it shows has changed; typing in the
+    # search box reruns the script but reuses the last HTML from session state.
+    map_sig = (answer.key, tuple(st.session_state.history), colorize, ring)
+    if st.session_state.get("map_sig") != map_sig:
+        # Build rings + labels (in SVG)
+        rings_and_labels: List[Tuple[float,float,str,float,str]] = []
+        guessed = [s for s in (resolve_guess(g, BY_KEY) for g in st.session_state.history)
+                   if s and s.key != answer.key]
+        projected = project_many(SVG_W, SVG_H, [(s.fx, s.fy) for s in guessed], answer.fx, answer.fy, ZOOM)
+        for st_obj, (sx, sy) in zip(guessed, projected):
+            if 0 <= sx <= VIEW_W and 0 <= sy <= VIEW_H:
+                color_hex = "#f59e0b" if same_line(st_obj, answer) else "#ef4444"
+                rings_and_labels.append((sx, sy, color_hex, 34.0, st_obj.name))
+        st.session_state.map_html = make_map_html(SVG_URI if colorize else SVG_GRAY_URI, SVG_W, SVG_H,
+                                                  answer.fx, answer.fy, ZOOM, ring, rings_and_labels)
+        st.session_state.map_sig = map_sig
 
     _L, mid, _R = st.columns([1,2,1])
     with mid:
@@ -354,8 +477,7 @@ elif st.session_state.phase in ("play","end"):
                 unsafe_allow_html=True
             )
 
-        html_map = make_map_html(SVG_URI, SVG_W, SVG_H, answer.fx, answer.fy, ZOOM, colorize, ring, rings_and_labels)
-        st.markdown(html_map, unsafe_allow_html=True)
+        st.markdown(st.session_state.map_html, unsafe_allow_html=True)
 
         if st.session_state.phase == "play":
             q_now = st.text_input(
@@ -366,7 +488,7 @@ elif st.session_state.phase in ("play","end"):
             )
 
             # 8 suggestions in two columns
-            sugg = prefix_suggestions(q_now or "", NAMES, limit=8)
+            sugg = prefix_suggestions(q_now or "", NAME_INDEX, limit=8)
 
             if sugg:
                 box = st.container()
@@ -374,35 +496,8 @@ elif st.session_state.phase in ("play","end"):
 
                 for i, s in enumerate(sugg):
                     col = col_l if i % 2 == 0 else col_r
-                    if col.button(s, key=f"sugg_{norm(s)}", use_container_width=True):
-                        st.session_state.history.append(s)
-                        st.session_state.remaining -= 1
-                        chosen = resolve_guess(s, BY_KEY)
-                        if chosen and chosen.key == answer.key:
-                            st.session_state.won = True
-                            st.session_state.phase = "end"
-                            st.session_state["feedback"] = ""
-
-                            # PRACTICE STREAK RULE:
-                            # Increment only if it's a FIRST-TRY win; otherwise reset.
-                            if st.session_state.mode == "practice":
-                                if len(st.session_state.history) == 1:
-                                    st.session_state.streak += 1
-                                else:
-                                    st.session_state.streak = 0
-                        else:
-                            if chosen and same_line(chosen, answer):
-                                lines = ", ".join(overlap_lines(chosen, answer)) or "right line"
-                                st.session_state["feedback"] = f"Wrong station, but correct line ({lines})."
-                            else:
-                                st.session_state["feedback"] = "Wrong station."
-                            if st.session_state.remaining <= 0:
-                                st.session_state.won = False
-                                st.session_state.phase = "end"
-                                # Reset streak on loss
-                                if st.session_state.mode == "practice":
-                                    st.session_state.streak = 0
-                        st.rerun()
+                    col.button(s, key=f"sugg_{norm(s)}", use_container_width=True,
+                               on_click=submit_guess, args=(s,))
 
         if st.session_state.get("feedback"):
             st.info(st.session_state["feedback"])